@@ -1,126 +1,382 @@
 import os
 import re
+from multiprocessing import Pool
 from datetime import datetime
 import argparse
-import toml
+import asyncio
+import codecs
+import hashlib
+import json
+import shutil
+import tomllib
 import yaml
 import anthropic
-from typing import Optional, Tuple, Dict, List
-import time
+import httpx
+from typing import Optional, Tuple, Dict, List, Iterator
+
+_DATE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})-")
+_DATE_PREFIX_RE = re.compile(r"^\d{4}-\d{2}-\d{2}-")
+# Markdown images and links. The negated classes stop at the first closing
+# bracket (or the end of the line) without any backtracking
+_MD_MEDIA_RE = re.compile(r"!?\[[^\]\n]*\]\([^)\n]*\)")
+
+# Fields in a reply that isn't valid JSON as a whole
+_JSON_DESCRIPTION_RE = re.compile(r'"description"\s*:\s*("(?:[^"\\]|\\.)*")')
+_JSON_TAGS_RE = re.compile(r'"tags"\s*:\s*\[([^\]]*)\]')
+_JSON_STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"')
+
+# Use the libyaml C emitter when PyYAML was built with it
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+METADATA_INSTRUCTIONS = """You write metadata for blog posts. You will be given the
+title and the start of the content of a post.
+
+Return ONLY a JSON object with keys "description" (string) and "tags" (array of
+lowercase strings), without any other text or code fences:
+"description": a concise 1-2 sentence description. Make it engaging but factual,
+and keep it under 160 characters.
+"tags": 3-6 relevant tags. Use lowercase words, and include specific technologies
+or concepts mentioned."""
+
+
+# Wide enough to cover the progress line drawn by Progress
+_PROGRESS_WIDTH = 40
+
+
+def log(message: str) -> None:
+    """Print a message on its own line, over any progress line being drawn"""
+    print("\r" + message.ljust(_PROGRESS_WIDTH))
+
+
+class RateLimiter:
+    """Space out API requests so that at most `rate` start per minute"""
+
+    def __init__(self, rate: int):
+        self.interval = 60.0 / rate
+        self._lock = asyncio.Lock()
+        self._next_slot = 0.0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
 
 
 class ZolaToAstroConverter:
-    def __init__(self, anthropic_api_key: Optional[str] = None):
+    def __init__(
+        self,
+        anthropic_api_key: Optional[str] = None,
+        requests_per_minute: int = 50,
+        cache_path: Optional[str] = None,
+        max_retries: int = 5,
+    ):
+        # The SDK retries rate limits (429), overloads and connection errors with
+        # exponential backoff and jitter, honouring any retry-after header.
+        # All requests share one connection pool sized for concurrent use.
         self.client = (
-            anthropic.Anthropic(api_key=anthropic_api_key)
+            anthropic.AsyncAnthropic(
+                api_key=anthropic_api_key,
+                max_retries=max_retries,
+                http_client=anthropic.DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=64, max_keepalive_connections=32
+                    ),
+                    timeout=httpx.Timeout(60.0, connect=10.0),
+                ),
+            )
             if anthropic_api_key
             else None
         )
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.cache_path = cache_path
+        self.cache = self.load_cache(cache_path) if cache_path else {}
+        self._mkdir_cache: set[str] = set()
+
+    @staticmethod
+    def load_cache(path: str) -> Dict[str, Dict]:
+        """Load previously generated descriptions and tags, keyed by request hash"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            log(f"Warning: Could not read cache {path}: {e}")
+            return {}
+
+    def save_cache(self) -> None:
+        """Write the generated descriptions and tags back to the cache file"""
+        if not self.cache_path:
+            return
+
+        try:
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f, ensure_ascii=False, indent=1)
+        except OSError as e:
+            log(f"Warning: Could not write cache {self.cache_path}: {e}")
+
+    @staticmethod
+    def cache_key(params: Dict) -> str:
+        """Hash the request parameters, so any change to the content or prompt misses"""
+        return hashlib.sha256(
+            json.dumps(params, sort_keys=True).encode("utf-8")
+        ).hexdigest()
 
     @staticmethod
     def parse_date_from_filename(filename: str) -> Optional[str]:
         """Extract date from filename format YYYY-MM-DD-title.md"""
-        match = re.match(r"(\d{4}-\d{2}-\d{2})-.*", filename)
+        match = _DATE_RE.match(filename)
         return match.group(1) if match else None
 
     @staticmethod
     def clean_filename(filename: str) -> str:
         """Remove date prefix from filename"""
-        return re.sub(r"^\d{4}-\d{2}-\d{2}-", "", filename)
+        return _DATE_PREFIX_RE.sub("", filename)
 
     @staticmethod
     def extract_zola_frontmatter(content: str) -> Tuple[Optional[Dict], str]:
         """Extract Zola's TOML frontmatter between +++ markers"""
         try:
-            # Find content between +++ markers
-            pattern = r"\+\+\+(.*?)\+\+\+"
-            match = re.search(pattern, content, re.DOTALL)
+            # Find content between the opening +++ and the first +++ line after it,
+            # skipping a byte order mark and whitespace in front of it
+            start = len(content) - len(content.removeprefix("\ufeff").lstrip())
+            if not content.startswith("+++", start):
+                return None, content
 
-            if not match:
+            end = content.find("\n+++", start + 3)
+            if end == -1:
                 return None, content
 
-            frontmatter_raw = match.group(1).strip()
-            remaining_content = content[match.end() :].strip()
+            frontmatter_raw = content[start + 3 : end].strip()
+            remaining_content = content[end + 4 :].strip()
 
             # Parse TOML with proper error handling
             try:
-                frontmatter_data = toml.loads(frontmatter_raw)
+                frontmatter_data = tomllib.loads(frontmatter_raw)
                 return frontmatter_data, remaining_content
-            except toml.TomlDecodeError as e:
+            except tomllib.TOMLDecodeError as e:
                 # Try to clean up the TOML before parsing
                 cleaned_toml = frontmatter_raw.replace("\n\n", "\n").strip()
                 try:
-                    frontmatter_data = toml.loads(cleaned_toml)
+                    frontmatter_data = tomllib.loads(cleaned_toml)
                     return frontmatter_data, remaining_content
-                except toml.TomlDecodeError:
-                    print(f"Error parsing TOML even after cleanup: {e}")
-                    print("Raw frontmatter content:")
-                    print(frontmatter_raw)
+                except tomllib.TOMLDecodeError:
+                    log(f"Error parsing TOML even after cleanup: {e}")
+                    log("Raw frontmatter content:")
+                    log(frontmatter_raw)
                     return None, content
 
         except Exception as e:
-            print(f"Error extracting frontmatter: {e}")
+            log(f"Error extracting frontmatter: {e}")
             return None, content
 
-    def generate_description(self, content: str, title: str) -> str:
-        """Generate a description using Anthropic's Claude API"""
-        if not self.client:
-            return ""
+    @staticmethod
+    def metadata_params(content: str, title: str) -> Dict:
+        """Build the Claude request parameters for generating a description and tags"""
+        # Remove markdown images and links for cleaner content. Only the first
+        # 1500 characters are sent, so leave some slack for what gets removed
+        # but don't clean the rest of the post
+        cleaned_content = _MD_MEDIA_RE.sub("", content[:4000])[:1500]
+
+        prompt = f"""Title: "{title}"
+        Content: {cleaned_content}..."""
+
+        return {
+            "model": "claude-3-haiku-20240307",
+            "max_tokens": 300,
+            # The instructions are the same for every post, so mark them as a
+            # cacheable prefix and only send the post itself as the user turn
+            "system": [
+                {
+                    "type": "text",
+                    "text": METADATA_INSTRUCTIONS,
+                    "cache_control": {"type": "ephemeral"},
+                }
+            ],
+            "messages": [{"role": "user", "content": prompt}],
+        }
+
+    @staticmethod
+    def parse_metadata(text: str) -> Dict:
+        """Parse Claude's JSON reply into a description and a list of tags
 
-        # Remove markdown images and links for cleaner content
-        cleaned_content = re.sub(r"!\[.*?\]\(.*?\)", "", content)
-        cleaned_content = re.sub(r"\[.*?\]\(.*?\)", "", cleaned_content)
+        If the reply isn't valid JSON, e.g. because it came wrapped in prose or a
+        code fence, the fields are picked out individually instead.
+        """
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            data = {}
+            match = _JSON_DESCRIPTION_RE.search(text)
+            if match:
+                data["description"] = json.loads(match.group(1), strict=False)
+            match = _JSON_TAGS_RE.search(text)
+            if match:
+                data["tags"] = [
+                    json.loads(tag, strict=False)
+                    for tag in _JSON_STRING_RE.findall(match.group(1))
+                ]
+            if not data:
+                raise ValueError(f"No description or tags in reply: {text!r}")
+
+        if not isinstance(data, dict):
+            raise ValueError(f"Expected a JSON object, got: {text!r}")
+
+        # Only keep fields of the expected type, anything else counts as missing
+        metadata = {}
+        description = data.get("description")
+        if isinstance(description, str) and description.strip():
+            metadata["description"] = description.strip()
+        tags = data.get("tags")
+        if isinstance(tags, list) and tags and all(isinstance(t, str) for t in tags):
+            metadata["tags"] = [tag.strip().lower() for tag in tags]
+        return metadata
 
-        prompt = f"""Please write a concise 1-2 sentence description for a blog post titled "{title}". 
-        Here's the content:
-        {cleaned_content[:1500]}...
-        
-        Generate only the description, nothing else. Make it engaging but factual, 
-        and keep it under 160 characters."""
+    @staticmethod
+    def is_complete(metadata: Dict) -> bool:
+        """Whether generated metadata has both fields, and so is worth caching"""
+        return "description" in metadata and "tags" in metadata
+
+    async def generate_metadata(self, content: str, title: str) -> Dict:
+        """Generate a description and tags with a single Claude API call"""
+        if not self.client:
+            return {}
+
+        params = self.metadata_params(content, title)
+        key = self.cache_key(params)
+        if key in self.cache:
+            return self.cache[key]
 
         try:
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=200,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            return response.content[0].text.strip()
+            await self.rate_limiter.acquire()
+            response = await self.client.messages.create(**params)
+            metadata = self.parse_metadata(response.content[0].text)
+            if self.is_complete(metadata):
+                self.cache[key] = metadata
+            else:
+                log(
+                    f"Warning: Incomplete reply for {title!r}: {response.content[0].text!r}"
+                )
+            return metadata
         except Exception as e:
-            print(f"Error generating description: {e}")
-            return ""
+            log(f"Error generating description and tags: {e}")
+            return {}
 
-    def generate_tags(self, content: str, title: str) -> List[str]:
-        """Generate relevant tags using Anthropic's Claude API"""
+    async def generate_for_file(self, input_path: str) -> Dict:
+        """Generate a description and tags for a post that is missing either"""
+        try:
+            head, _ = await asyncio.to_thread(self.read_head, input_path)
+        except (OSError, UnicodeDecodeError):
+            # convert_file runs into the same error and reports the file as failed
+            return {}
+
+        zola_data, markdown_content = self.extract_zola_frontmatter(head)
+        if not zola_data or not self.needs_metadata(zola_data):
+            return {}
+
+        return await self.generate_metadata(
+            markdown_content, zola_data.get("title", "")
+        )
+
+    async def generate_batch(
+        self, input_paths: List[str], poll_interval: float = 20.0
+    ) -> Dict[str, Dict]:
+        """Generate missing descriptions and tags with the Message Batches API"""
+        generated = {input_path: {} for input_path in input_paths}
         if not self.client:
-            return []
+            return generated
+
+        # First pass: find out which files need a description and/or tags
+        requests = []
+        cache_keys = {}
+        for index, input_path in enumerate(input_paths):
+            try:
+                head, _ = await asyncio.to_thread(self.read_head, input_path)
+            except (OSError, UnicodeDecodeError) as e:
+                log(f"Error reading {input_path}: {e}")
+                continue
+
+            zola_data, markdown_content = self.extract_zola_frontmatter(head)
+            if not zola_data or not self.needs_metadata(zola_data):
+                continue
 
-        # Clean content for better tag generation
-        cleaned_content = re.sub(r"!\[.*?\]\(.*?\)", "", content)
-        cleaned_content = re.sub(r"\[.*?\]\(.*?\)", "", cleaned_content)
+            params = self.metadata_params(markdown_content, zola_data.get("title", ""))
+            key = self.cache_key(params)
+            if key in self.cache:
+                generated[input_path] = self.cache[key]
+                continue
 
-        prompt = f"""Based on this blog post title and content, suggest 3-6 relevant tags.
-        Title: "{title}"
-        Content: {cleaned_content[:1500]}...
-        
-        Return only the tags as a comma-separated list, nothing else. Use lowercase words, 
-        and include specific technologies or concepts mentioned."""
+            cache_keys[index] = key
+            requests.append({"custom_id": f"post-{index}", "params": params})
+
+        if not requests:
+            return generated
 
         try:
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=100,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            tags = [tag.strip().lower() for tag in response.content[0].text.split(",")]
-            return tags
+            batch = await self.client.messages.batches.create(requests=requests)
+            log(f"Submitted batch {batch.id} with {len(requests)} requests")
+
+            while batch.processing_status != "ended":
+                await asyncio.sleep(poll_interval)
+                batch = await self.client.messages.batches.retrieve(batch.id)
+
+            async for result in await self.client.messages.batches.results(batch.id):
+                index = int(result.custom_id.removeprefix("post-"))
+                input_path = input_paths[index]
+                if result.result.type != "succeeded":
+                    log(
+                        f"Error generating description and tags for {input_path}: "
+                        f"{result.result.type}"
+                    )
+                    continue
+
+                try:
+                    text = result.result.message.content[0].text
+                    generated[input_path] = self.parse_metadata(text)
+                    if self.is_complete(generated[input_path]):
+                        self.cache[cache_keys[index]] = generated[input_path]
+                    else:
+                        log(f"Warning: Incomplete reply for {input_path}: {text!r}")
+                except Exception as e:
+                    log(f"Error generating description and tags for {input_path}: {e}")
         except Exception as e:
-            print(f"Error generating tags: {e}")
-            return []
+            log(f"Error running batch: {e}")
+
+        return generated
+
+    @staticmethod
+    def existing_description(zola_data: Dict) -> Optional[str]:
+        """Get the description from Zola frontmatter, if any"""
+        extra = zola_data.get("extra") or {}
+        return extra.get("lead") or zola_data.get("description")
+
+    @staticmethod
+    def existing_tags(zola_data: Dict) -> set:
+        """Get tags and categories from Zola frontmatter"""
+        taxonomies = zola_data.get("taxonomies") or {}
+        return set(taxonomies.get("tags", ())) | set(taxonomies.get("categories", ()))
+
+    def needs_metadata(self, zola_data: Dict) -> bool:
+        """Whether the post lacks a description or tags that could be generated"""
+        return bool(self.client) and not (
+            self.existing_description(zola_data) and self.existing_tags(zola_data)
+        )
 
     def create_astro_frontmatter(
-        self, zola_data: Dict, pub_date: str, author: str, markdown_content: str
+        self,
+        zola_data: Dict,
+        pub_date: str,
+        author: str,
+        generated: Optional[Dict] = None,
     ) -> Dict:
-        """Convert Zola frontmatter to Astro format with AI-generated content if needed"""
+        """Convert Zola frontmatter to Astro format
+
+        Missing descriptions and tags are taken from `generated`, the output of
+        generate_metadata or generate_batch, if given.
+        """
         # Start with basic required fields
         astro_data = {
             "title": zola_data.get("title", ""),
@@ -128,92 +384,299 @@ class ZolaToAstroConverter:
             "author": author,
         }
 
-        # Handle description
-        description = None
-        if "extra" in zola_data and "lead" in zola_data["extra"]:
-            description = zola_data["extra"]["lead"]
-        elif "description" in zola_data:
-            description = zola_data["description"]
+        description = self.existing_description(zola_data)
+        tags = self.existing_tags(zola_data)
 
-        if not description and self.client:
-            description = self.generate_description(
-                markdown_content, astro_data["title"]
-            )
-            if description:
-                print(f"Generated description: {description}")
+        if generated:
+            if not description:
+                description = generated.get("description", "")
+
+            if not tags:
+                tags.update(generated.get("tags", []))
 
         if description:
             astro_data["description"] = description
 
-        # Handle tags
-        tags = set()
-        if "taxonomies" in zola_data:
-            if "tags" in zola_data["taxonomies"]:
-                tags.update(zola_data["taxonomies"]["tags"])
-            if "categories" in zola_data["taxonomies"]:
-                tags.update(zola_data["taxonomies"]["categories"])
-
-        if not tags and self.client:
-            generated_tags = self.generate_tags(markdown_content, astro_data["title"])
-            if generated_tags:
-                tags.update(generated_tags)
-                print(f"Generated tags: {', '.join(generated_tags)}")
-
         if tags:
             astro_data["tags"] = sorted(list(tags))
 
         return astro_data
 
-    def convert_file(self, input_path: str, output_path: str, author: str) -> bool:
+    @staticmethod
+    def read_head(path: str, chunk_size: int = 8192) -> Tuple[str, int]:
+        """Read a file up to the end of its frontmatter plus the start of the body
+
+        Returns the text read and the byte offset at which the body starts, or -1
+        if the file has no closing +++. The rest of the body is never loaded.
+        """
+        with open(path, "rb") as f:
+            head = f.read(chunk_size)
+            start = len(head) - len(head.removeprefix(codecs.BOM_UTF8).lstrip())
+            end = -1
+            if head.startswith(b"+++", start):
+                end = head.find(b"\n+++", start + 3)
+                while end == -1:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    # The marker may straddle the previous chunk boundary
+                    search_from = max(start + 3, len(head) - 3)
+                    head += chunk
+                    end = head.find(b"\n+++", search_from)
+
+            if end == -1:
+                return head.decode("utf-8-sig"), -1
+
+            body_start = end + 4
+            # Keep enough of the body around for generating a description
+            if len(head) - body_start < chunk_size:
+                head += f.read(chunk_size - (len(head) - body_start))
+
+        # The last chunk may end halfway through a multi-byte character
+        text = head[:body_start].decode("utf-8-sig")
+        text += head[body_start:].decode("utf-8", errors="ignore")
+        return text, body_start
+
+    @staticmethod
+    def write_file(
+        path: str, astro_data: Dict, input_path: str, body_start: int
+    ) -> None:
+        """Write the Astro frontmatter followed by the body of input_path
+
+        The body is copied as is, so the frontmatter uses the line ending of the
+        source's first line to avoid mixing CRLF and LF in one file.
+        """
+        with open(input_path, "rb") as src, open(path, "wb", buffering=1 << 16) as dst:
+            newline = "\r\n" if src.readline().endswith(b"\r\n") else "\n"
+
+            # Dump the frontmatter straight into the file buffer
+            dst.write(f"---{newline}".encode())
+            yaml.dump(
+                astro_data,
+                dst,
+                Dumper=_YAML_DUMPER,
+                encoding="utf-8",
+                line_break=newline,
+                default_flow_style=False,
+                allow_unicode=True,
+                sort_keys=False,
+            )
+            dst.write(f"---{newline}{newline}".encode())
+
+            src.seek(body_start)
+
+            # Skip the blank lines between the frontmatter and the body
+            for chunk in iter(lambda: src.read(8192), b""):
+                chunk = chunk.lstrip()
+                if chunk:
+                    dst.write(chunk)
+                    break
+
+            shutil.copyfileobj(src, dst)
+
+    def convert_file(
+        self,
+        input_path: str,
+        output_path: str,
+        author: str,
+        generated: Optional[Dict] = None,
+    ) -> bool:
         """Convert a single Zola markdown file to Astro format"""
         try:
-            with open(input_path, "r", encoding="utf-8") as f:
-                content = f.read()
+            head, body_start = self.read_head(input_path)
 
             # Extract date from filename
             pub_date = self.parse_date_from_filename(os.path.basename(input_path))
             if not pub_date:
-                print(f"Warning: Could not parse date from filename {input_path}")
+                log(f"Warning: Could not parse date from filename {input_path}")
                 pub_date = datetime.now().strftime("%Y-%m-%d")
 
             # Parse Zola frontmatter
-            zola_data, markdown_content = self.extract_zola_frontmatter(content)
+            zola_data, _ = self.extract_zola_frontmatter(head)
             if not zola_data:
-                print(f"Warning: Could not parse frontmatter in {input_path}")
+                log(f"Warning: Could not parse frontmatter in {input_path}")
                 return False
 
             # Create Astro frontmatter with optional AI-generated content
             astro_data = self.create_astro_frontmatter(
-                zola_data, pub_date, author, markdown_content
+                zola_data, pub_date, author, generated
             )
 
-            # Generate new content
-            new_content = "---\n"
-            new_content += yaml.dump(
-                astro_data,
-                default_flow_style=False,
-                allow_unicode=True,
-                sort_keys=False,
-            )
-            new_content += "---\n\n"
-            new_content += markdown_content
-
             # Write to new file
             output_filename = self.clean_filename(os.path.basename(input_path))
             output_file = os.path.join(output_path, output_filename)
 
-            os.makedirs(os.path.dirname(output_file), exist_ok=True)
-
-            with open(output_file, "w", encoding="utf-8") as f:
-                f.write(new_content)
+            # Only create each output directory once per run
+            if output_path not in self._mkdir_cache:
+                os.makedirs(output_path, exist_ok=True)
+                self._mkdir_cache.add(output_path)
+
+            self.write_file(output_file, astro_data, input_path, body_start)
+
+            # If generation came up short, still write the post but date it before
+            # the source, so the next run doesn't skip it and tries again
+            missing = [
+                field for field in ("description", "tags") if field not in astro_data
+            ]
+            if missing and self.needs_metadata(zola_data):
+                log(
+                    f"Warning: No {' or '.join(missing)} generated for {input_path}, "
+                    "it will be retried on the next run"
+                )
+                source_mtime = os.stat(input_path).st_mtime
+                os.utime(output_file, (source_mtime - 1, source_mtime - 1))
 
             return True
 
         except Exception as e:
-            print(f"Error converting file {input_path}: {e}")
+            log(f"Error converting file {input_path}: {e}")
             return False
 
 
+class Progress:
+    """Single progress line that is redrawn as files finish, plus a failure list"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failures: List[str] = []
+        self.generated = 0
+        self._shown = -1
+
+    def update(self, input_path: str, ok: bool, generated: bool = False) -> None:
+        self.done += 1
+        if not ok:
+            self.failures.append(input_path)
+        elif generated:
+            self.generated += 1
+
+        # Only redraw when the percentage changes
+        percent = self.done * 100 // self.total
+        if percent != self._shown:
+            self._shown = percent
+            print(
+                f"\rConverting: {self.done}/{self.total} ({percent}%)",
+                end="",
+                flush=True,
+            )
+
+    @property
+    def success_count(self) -> int:
+        return self.done - len(self.failures)
+
+    def close(self) -> None:
+        if self.done:
+            print()
+        if self.generated:
+            print(f"Generated missing descriptions and tags for {self.generated} files")
+        if self.failures:
+            print(f"\nFailed to convert {len(self.failures)} files:")
+            for input_path in self.failures:
+                print(f"  {input_path}")
+
+
+async def convert_all(
+    converter: ZolaToAstroConverter,
+    jobs: List[Tuple[str, str]],
+    author: str,
+    concurrency: int,
+    batch: bool = False,
+) -> int:
+    """Convert all (input_path, output_path) pairs, generating missing content"""
+    generated = {}
+    if batch:
+        generated = await converter.generate_batch(
+            [input_path for input_path, _ in jobs]
+        )
+
+    semaphore = asyncio.Semaphore(concurrency)
+    progress = Progress(len(jobs))
+
+    async def convert_one(input_path: str, output_path: str) -> None:
+        async with semaphore:
+            if batch:
+                metadata = generated.get(input_path)
+            else:
+                metadata = await converter.generate_for_file(input_path)
+            ok = await asyncio.to_thread(
+                converter.convert_file, input_path, output_path, author, metadata
+            )
+        progress.update(input_path, ok, generated=bool(metadata))
+
+    try:
+        await asyncio.gather(
+            *(convert_one(input_path, output_path) for input_path, output_path in jobs)
+        )
+    finally:
+        # Keep everything generated so far, even if the run is aborted
+        converter.save_cache()
+    progress.close()
+    return progress.success_count
+
+
+_worker_converter: Optional[ZolaToAstroConverter] = None
+
+
+def _convert_worker(job: Tuple[str, str, str]) -> Tuple[str, bool]:
+    """Convert a single file in a worker process, returning (input_path, ok)"""
+    global _worker_converter
+    if _worker_converter is None:
+        _worker_converter = ZolaToAstroConverter()
+
+    input_path, output_path, author = job
+    return input_path, _worker_converter.convert_file(input_path, output_path, author)
+
+
+def convert_all_parallel(jobs: List[Tuple[str, str]], author: str) -> int:
+    """Convert all (input_path, output_path) pairs across CPU cores, without AI"""
+    progress = Progress(len(jobs))
+    with Pool() as pool:
+        for input_path, ok in pool.imap_unordered(
+            _convert_worker,
+            [(input_path, output_path, author) for input_path, output_path in jobs],
+            chunksize=16,
+        ):
+            progress.update(input_path, ok)
+    progress.close()
+    return progress.success_count
+
+
+def iter_markdown_files(
+    root: str, rel_dir: str = ""
+) -> Iterator[Tuple[os.DirEntry, str]]:
+    """Recursively yield (entry, directory relative to the top) for markdown files
+
+    os.scandir entries know their file type from the directory listing and cache
+    their stat result, so each file is stat'ed at most once.
+    """
+    try:
+        entries = os.scandir(root)
+    except OSError as e:
+        # Like os.walk, skip directories that can't be listed (the input directory
+        # itself is checked up front)
+        print(f"Warning: Could not read directory {root}: {e}")
+        return
+
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_markdown_files(
+                    entry.path, os.path.join(rel_dir, entry.name)
+                )
+            elif entry.name.endswith(".md"):
+                yield entry, rel_dir
+
+
+def is_up_to_date(entry: os.DirEntry, output_file: str) -> bool:
+    """Whether output_file exists and was written after the input last changed"""
+    try:
+        return os.path.getmtime(output_file) >= entry.stat().st_mtime
+    except OSError:
+        # No output yet, or an input that can't be stat'ed (e.g. a dangling
+        # symlink), which convert_file then reports as failed
+        return False
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Convert Zola blog posts to Astro format"
@@ -238,49 +701,95 @@ def main():
         action="store_true",
         help="Show what would be done without making any changes",
     )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=5,
+        help="How often to retry a rate limited or failed Anthropic API request",
+    )
+    parser.add_argument(
+        "--cache-file",
+        default=".zola2astro-cache.json",
+        help="File for caching generated descriptions and tags between runs",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Generate missing content with the Message Batches API (cheaper, but slower)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Convert all files, even if the output is newer than the input",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of files converted at the same time",
+    )
+    parser.add_argument(
+        "--rpm",
+        type=int,
+        default=50,
+        help="Maximum number of Anthropic API requests per minute",
+    )
 
     args = parser.parse_args()
+    if not os.path.isdir(args.input_dir):
+        parser.error(f"input directory {args.input_dir} does not exist")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.rpm < 1:
+        parser.error("--rpm must be at least 1")
 
     # Initialize converter
     converter = ZolaToAstroConverter(
-        args.anthropic_key if args.generate_missing else None
+        args.anthropic_key if args.generate_missing else None,
+        requests_per_minute=args.rpm,
+        cache_path=args.cache_file if args.generate_missing else None,
+        max_retries=args.max_retries,
     )
 
     if not args.dry_run:
         # Create output directory if it doesn't exist
         os.makedirs(args.output_dir, exist_ok=True)
 
-    # Process all markdown files
-    success_count = 0
-    total_count = 0
-
-    for root, _, files in os.walk(args.input_dir):
-        for file in files:
-            if file.endswith(".md"):
-                total_count += 1
-                input_path = os.path.join(root, file)
-
-                # Maintain directory structure
-                rel_path = os.path.relpath(root, args.input_dir)
-                output_path = os.path.join(args.output_dir, rel_path)
-
-                if args.dry_run:
-                    print(f"Would convert: {file}")
-                    continue
-
-                if converter.convert_file(input_path, output_path, args.author):
-                    success_count += 1
-                    print(f"Converted: {file}")
-                else:
-                    print(f"Failed to convert: {file}")
-
-                # Add small delay between API calls if using Anthropic
-                if args.generate_missing:
-                    time.sleep(1)
+    # Collect all markdown files
+    jobs = []
+    skipped_count = 0
+    for entry, rel_dir in iter_markdown_files(args.input_dir):
+        # Maintain directory structure
+        output_path = os.path.join(args.output_dir, rel_dir)
+
+        # Skip files that haven't changed since they were last converted
+        output_file = os.path.join(output_path, converter.clean_filename(entry.name))
+        if not args.force and is_up_to_date(entry, output_file):
+            skipped_count += 1
+            continue
+
+        if args.dry_run:
+            print(f"Would convert: {entry.name}")
+
+        jobs.append((entry.path, output_path))
+
+    total_count = len(jobs)
+    if args.dry_run:
+        success_count = 0
+    elif converter.client:
+        success_count = asyncio.run(
+            convert_all(
+                converter, jobs, args.author, args.concurrency, batch=args.batch
+            )
+        )
+    else:
+        success_count = convert_all_parallel(jobs, args.author)
 
     print(
         f"\nConversion complete: {success_count}/{total_count} files converted successfully"
     )
+    if skipped_count:
+        print(f"Skipped {skipped_count} unchanged files (use --force to convert them)")
 
 
 if __name__ == "__main__":